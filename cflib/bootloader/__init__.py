@@ -424,7 +424,7 @@ class Bootloader:
                     time.sleep(2)
                     raise RuntimeError(message)
 
-            # The decks dictionary uses the deck index as the key. Note that all indexes might not be present as some
+            # The decks mapping uses the deck index as the key. Note that all indexes might not be present as some
             # decks do not support memory operations. decks.keys() might return the set {2, 4}.
 
             for deck_index in sorted(decks.keys()):
@@ -149,7 +149,8 @@ class _WriteRequest:
         self.addr = addr
         self._bytes_left = len(data)
         self._write_len = self._bytes_left
-        self._data = data
+        # Chunks are sliced from a memoryview to avoid copying the remaining data for every packet
+        self._data = memoryview(bytes(data))
         self.data = bytearray()
         self.cf = cf
         self._progress_cb = progress_cb
@@ -193,7 +194,7 @@ class _WriteRequest:
         reply = struct.unpack('<BBBBB', pk.data)
         self._sent_reply = reply
         # Add the data
-        pk.data += struct.pack('B' * len(data), *data)
+        pk.data += data
         self._sent_packet = pk
         self.cf.send_packet(pk, expected_reply=reply, timeout=1)
 
@@ -266,6 +267,13 @@ class Memory():
         self.mem_write_cb = Caller()
         self.mem_write_failed_cb = Caller()
 
+        # Callbacks registered for one memory id only, see register()
+        self._registered_read_cbs = {}
+        self._registered_read_failed_cbs = {}
+        self._registered_write_cbs = {}
+        self._registered_write_failed_cbs = {}
+        self._registered_disconnected_cbs = {}
+
         self._refresh_callback = None
         self._refresh_failed_callback = None
         self._fetch_id = 0
@@ -296,6 +304,35 @@ class Memory():
                 self._refresh_callback()
                 self._clear_refresh_callbacks()
 
+    def register(self, mem_id, read_cb=None, read_failed_cb=None, write_cb=None, write_failed_cb=None,
+                 disconnected_cb=None):
+        """
+        Register callbacks for reads and writes of the memory with the supplied id. Unlike the callbacks
+        added to mem_read_cb and friends, they are not called for other memories. The disconnected_cb is
+        called when the link is lost, before the failed callbacks of the reads and writes in progress.
+        """
+        for registered, cb in ((self._registered_read_cbs, read_cb),
+                               (self._registered_read_failed_cbs, read_failed_cb),
+                               (self._registered_write_cbs, write_cb),
+                               (self._registered_write_failed_cbs, write_failed_cb),
+                               (self._registered_disconnected_cbs, disconnected_cb)):
+            if cb is not None:
+                registered[mem_id] = cb
+
+    def unregister(self, mem_id):
+        """Remove the callbacks registered for the memory with the supplied id"""
+        self._registered_read_cbs.pop(mem_id, None)
+        self._registered_read_failed_cbs.pop(mem_id, None)
+        self._registered_write_cbs.pop(mem_id, None)
+        self._registered_write_failed_cbs.pop(mem_id, None)
+        self._registered_disconnected_cbs.pop(mem_id, None)
+
+    def _call_mem_cb(self, caller, registered, mem, *args):
+        caller.call(mem, *args)
+        cb = registered.get(mem.id)
+        if cb is not None:
+            cb(mem, *args)
+
     def get_mem(self, id):
         """Fetch the memory with the supplied id"""
         for m in self.mems:
@@ -379,6 +416,8 @@ class Memory():
 
     def _disconnected(self, uri):
         """The link to the Crazyflie has been broken. Reset state"""
+        for cb in list(self._registered_disconnected_cbs.values()):
+            cb()
         self._call_all_failed_callbacks()
         self._clear_state()
 
@@ -387,7 +426,7 @@ class Memory():
         read_requests = list(self._read_requests.values())
         self._read_requests.clear()
         for rreq in read_requests:
-            self.mem_read_failed_cb.call(rreq.mem, rreq.addr, rreq.data)
+            self._call_mem_cb(self.mem_read_failed_cb, self._registered_read_failed_cbs, rreq.mem, rreq.addr, rreq.data)
 
         # Write requests
         write_requests = []
@@ -398,7 +437,7 @@ class Memory():
         self._write_requests_lock.release()
 
         for wreq in write_requests:
-            self.mem_write_failed_cb.call(wreq.mem, wreq.addr)
+            self._call_mem_cb(self.mem_write_failed_cb, self._registered_write_failed_cbs, wreq.mem, wreq.addr)
 
         # Info
         if self._refresh_failed_callback:
@@ -519,10 +558,6 @@ class Memory():
             elif mem_type == MemoryElement.TYPE_DECK_MEMORY:
                 mem = DeckMemoryManager(id=mem_id, type=mem_type, size=mem_size, mem_handler=self)
                 logger.debug(mem)
-                self.mem_read_cb.add_callback(mem._new_data)
-                self.mem_read_failed_cb.add_callback(mem._new_data_failed)
-                self.mem_write_cb.add_callback(mem._write_done)
-                self.mem_write_failed_cb.add_callback(mem._write_failed)
             elif mem_type == MemoryElement.TYPE_DECK_MULTIRANGER:
                 mem = MultirangerMemory(id=mem_id, type=mem_type, size=mem_size, mem_handler=self)
                 logger.debug(mem)
@@ -594,24 +629,27 @@ class Memory():
             # Call callbacks after the lock has been released to alow for new writes
             # to be initiated from the callback.
             if do_call_sucess_cb:
-                self.mem_write_cb.call(wreq.mem, wreq.addr)
+                self._call_mem_cb(self.mem_write_cb, self._registered_write_cbs, wreq.mem, wreq.addr)
             if do_call_fail_cb:
-                self.mem_write_failed_cb.call(wreq.mem, wreq.addr)
+                self._call_mem_cb(self.mem_write_failed_cb, self._registered_write_failed_cbs, wreq.mem, wreq.addr)
 
     def _handle_chan_read(self, cmd, payload):
         id = cmd
-        (addr, status) = struct.unpack('<IB', payload[0:5])
-        data = struct.unpack('B' * len(payload[5:]), payload[5:])
-        logger.debug('READ: Mem={}, addr=0x{:X}, status=0x{}, data={}'.format(id, addr, status, data))
+        (addr, status) = struct.unpack_from('<IB', payload, 0)
+        # Slicing the memoryview does not copy the data, it is copied once when added to the read request
+        data = memoryview(payload)[5:]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('READ: Mem={}, addr=0x{:X}, status=0x{}, data={}'.format(id, addr, status, tuple(data)))
         # Find the read request
         if id in self._read_requests:
             logger.debug('READING: We are still interested in request for mem {}'.format(id))
             rreq = self._read_requests[id]
             if status == 0:
-                if rreq.add_data(addr, payload[5:]):
+                if rreq.add_data(addr, data):
                     self._read_requests.pop(id, None)
-                    self.mem_read_cb.call(rreq.mem, rreq.addr, rreq.data)
+                    self._call_mem_cb(self.mem_read_cb, self._registered_read_cbs, rreq.mem, rreq.addr, rreq.data)
             else:
                 logger.debug('Status {}: read failed.'.format(status))
                 self._read_requests.pop(id, None)
-                self.mem_read_failed_cb.call(rreq.mem, rreq.addr, rreq.data)
+                self._call_mem_cb(self.mem_read_failed_cb, self._registered_read_failed_cbs,
+                                  rreq.mem, rreq.addr, rreq.data)
@@ -21,12 +21,30 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 import logging
 import struct
+from collections import deque
+from collections import namedtuple
+from collections.abc import Mapping
+from threading import Lock
 
 from .memory_element import MemoryElement
 from cflib.utils.callbacks import Syncer
 
 logger = logging.getLogger(__name__)
 
+# A read or write queued in the DeckMemoryManager, data and progress_cb are only used for writes
+_TransferRequest = namedtuple('_TransferRequest', [
+    'base_address', 'mapped_address', 'length', 'data', 'complete_cb', 'failed_cb', 'progress_cb'])
+
+DeckMemoryFlags = namedtuple('DeckMemoryFlags', [
+    'is_valid', 'is_started', 'supports_read', 'supports_write', 'supports_fw_upgrade', 'is_fw_upgrade_required',
+    'is_bootloader_active', 'supports_reset_to_fw', 'supports_reset_to_bootloader'])
+_NO_FLAGS = DeckMemoryFlags(*([False] * len(DeckMemoryFlags._fields)))
+
+
+class DeckMemoryError(RuntimeError):
+    """ Error when accessing deck memories """
+    pass
+
 
 class DeckMemory:
     """
@@ -42,6 +60,10 @@ class DeckMemory:
     MASK_UPGRADE_REQUIRED = 32
     MASK_BOOTLOADER_ACTIVE = 64
 
+    # Bits that must all be set for a deck to accept read or write operations
+    _MASK_READY_FOR_READ = MASK_IS_STARTED | MASK_SUPPORTS_READ
+    _MASK_READY_FOR_WRITE = MASK_IS_STARTED | MASK_SUPPORTS_WRITE
+
     MASK_SUPPORTS_RESET_TO_FW = 1
     MASK_SUPPORTS_RESET_TO_BOOTLOADER = 2
 
@@ -55,14 +77,17 @@ class DeckMemory:
 
     def __init__(self, deck_memory_manager: 'DeckMemoryManager', _command_base_address):
         self._deck_memory_manager = deck_memory_manager
+        self._command_base_address = _command_base_address
+
         self.required_hash = None
         self.required_length = None
-        self.name = None
+        self._name_raw = None
+        self._name = None
 
         self._base_address = None
-        self._command_base_address = _command_base_address
         self._bit_field1 = 0
         self._bit_field2 = 0
+        self._flags = _NO_FLAGS
 
     def contains(self, address):
         max = self._base_address + self.MEMORY_MAX_SIZE
@@ -70,10 +95,10 @@ class DeckMemory:
 
     def write(self, address, data, write_complete_cb, write_failed_cb=None, progress_cb=None):
         """Write a block of binary data to the deck"""
-        if not self.supports_write:
-            raise Exception('Deck does not support write operations')
-        if not self.is_started:
-            raise Exception('Deck not ready')
+        if (self._bit_field1 & self._MASK_READY_FOR_WRITE) != self._MASK_READY_FOR_WRITE:
+            if not self.supports_write:
+                raise DeckMemoryError('Deck does not support write operations')
+            raise DeckMemoryError('Deck not ready')
 
         self._deck_memory_manager._write(self._base_address, address, data,
                                          write_complete_cb, write_failed_cb, progress_cb)
@@ -87,10 +112,10 @@ class DeckMemory:
 
     def read(self, address, length, read_complete_cb, read_failed_cb=None):
         """Read a block of data from a deck"""
-        if not self.supports_read:
-            raise Exception('Deck does not support read operations')
-        if not self.is_started:
-            raise Exception('Deck not ready')
+        if (self._bit_field1 & self._MASK_READY_FOR_READ) != self._MASK_READY_FOR_READ:
+            if not self.supports_read:
+                raise DeckMemoryError('Deck does not support read operations')
+            raise DeckMemoryError('Deck not ready')
 
         self._deck_memory_manager._read(self._base_address, address, length, read_complete_cb, read_failed_cb)
 
@@ -104,41 +129,52 @@ class DeckMemory:
         else:
             return None
 
+    @property
+    def flags(self):
+        return self._flags
+
     @property
     def is_valid(self):
-        return (self._bit_field1 & self.MASK_IS_VALID) != 0
+        return self._flags.is_valid
 
     @property
     def is_started(self):
-        return (self._bit_field1 & self.MASK_IS_STARTED) != 0
+        return self._flags.is_started
 
     @property
     def supports_read(self):
-        return (self._bit_field1 & self.MASK_SUPPORTS_READ) != 0
+        return self._flags.supports_read
 
     @property
     def supports_write(self):
-        return (self._bit_field1 & self.MASK_SUPPORTS_WRITE) != 0
+        return self._flags.supports_write
 
     @property
     def supports_fw_upgrade(self):
-        return (self._bit_field1 & self.MASK_SUPPORTS_UPGRADE) != 0
+        return self._flags.supports_fw_upgrade
 
     @property
     def is_fw_upgrade_required(self):
-        return (self._bit_field1 & self.MASK_UPGRADE_REQUIRED) != 0
+        return self._flags.is_fw_upgrade_required
 
     @property
     def is_bootloader_active(self):
-        return (self._bit_field1 & self.MASK_BOOTLOADER_ACTIVE) != 0
+        return self._flags.is_bootloader_active
 
     @property
     def supports_reset_to_fw(self):
-        return (self._bit_field2 & self.MASK_SUPPORTS_RESET_TO_FW) != 0
+        return self._flags.supports_reset_to_fw
 
     @property
     def supports_reset_to_bootloader(self):
-        return (self._bit_field2 & self.MASK_SUPPORTS_RESET_TO_BOOTLOADER) != 0
+        return self._flags.supports_reset_to_bootloader
+
+    @property
+    def name(self):
+        # Decoded on first use, most users of the deck memories never look at the name
+        if self._name is None and self._name_raw is not None:
+            self._name = self._name_raw.split(b'\x00', 1)[0].decode('ascii', errors='replace')
+        return self._name
 
     def reset_to_fw(self):
         data = struct.pack('<B', self.FLAG_COMMAND_RESET_TO_FW)
@@ -152,20 +188,25 @@ class DeckMemory:
         data = struct.pack('<L', size)
         self._write_command_data(self.ADR_FW_NEW_FLASH, data)
 
-    def _parse(self, data):
-        self._bit_field1, self._bit_field2 = struct.unpack('<BB', data[0:2])
-        if self.is_valid:
-            try:
-                self.required_hash, self.required_length, self._base_address, _name = struct.unpack('<LLL18s', data[2:])
-                self.name = _name.split(b'\x00')[0].decode()
-            except Exception as e:
-                logger.warning(f'Error while decoding deck mem ({e}), skipping!')
-                self._bit_field1 = 0
-                self._bit_field2 = 0
+    def _set_bit_fields(self, bit_field1, bit_field2):
+        # The flags only change when the bit fields are updated, decode them once
+        self._bit_field1 = bit_field1
+        self._bit_field2 = bit_field2
+
+        self._flags = DeckMemoryFlags(
+            is_valid=(bit_field1 & self.MASK_IS_VALID) != 0,
+            is_started=(bit_field1 & self.MASK_IS_STARTED) != 0,
+            supports_read=(bit_field1 & self.MASK_SUPPORTS_READ) != 0,
+            supports_write=(bit_field1 & self.MASK_SUPPORTS_WRITE) != 0,
+            supports_fw_upgrade=(bit_field1 & self.MASK_SUPPORTS_UPGRADE) != 0,
+            is_fw_upgrade_required=(bit_field1 & self.MASK_UPGRADE_REQUIRED) != 0,
+            is_bootloader_active=(bit_field1 & self.MASK_BOOTLOADER_ACTIVE) != 0,
+            supports_reset_to_fw=(bit_field2 & self.MASK_SUPPORTS_RESET_TO_FW) != 0,
+            supports_reset_to_bootloader=(bit_field2 & self.MASK_SUPPORTS_RESET_TO_BOOTLOADER) != 0)
 
     def _write_command_data(self, address, data):
         if not self.is_started:
-            raise Exception('Deck not ready')
+            raise DeckMemoryError('Deck not ready')
 
         syncer = Syncer()
         self._deck_memory_manager._write(self._command_base_address, address, data, syncer.success_cb,
@@ -174,6 +215,34 @@ class DeckMemory:
         return syncer.is_success
 
 
+class DeckMemories(Mapping):
+    """
+    Read only mapping from deck memory index to DeckMemory objects. The deck memories are
+    stored in a fixed size list, indexes without a valid deck memory are not present.
+    """
+
+    def __init__(self, size):
+        self._deck_memories = [None] * size
+
+    def __getitem__(self, index):
+        if not isinstance(index, int) or not 0 <= index < len(self._deck_memories):
+            raise KeyError(index)
+
+        deck_memory = self._deck_memories[index]
+        if deck_memory is None:
+            raise KeyError(index)
+        return deck_memory
+
+    def __iter__(self):
+        return (index for index, deck_memory in enumerate(self._deck_memories) if deck_memory is not None)
+
+    def __len__(self):
+        return sum(1 for deck_memory in self._deck_memories if deck_memory is not None)
+
+    def _set(self, index, deck_memory):
+        self._deck_memories[index] = deck_memory
+
+
 class DeckMemoryManager(MemoryElement):
     """
     Manager interface for deck memories. It is used to query
@@ -191,138 +260,269 @@ class DeckMemoryManager(MemoryElement):
     SIZE_OF_COMMAND_SECTION = 0x20
     SUPPORTED_VERSION = 3
 
+    # Max length of a transfer created by merging queued reads or writes
+    MAX_MERGED_TRANSFER_LENGTH = 0x100
+
+    # The info section is a version byte followed by a fixed number of deck memory info records
+    _DECK_MEM_INFO = struct.Struct('<BBLLL18s')
+
     def __init__(self, id, type, size, mem_handler):
         """Initialize deck memory manager"""
         super(DeckMemoryManager, self).__init__(id=id, type=type, size=size, mem_handler=mem_handler)
 
         self._query_complete_cb = None
         self._query_failed_cb = None
-        self.deck_memories = {}
-
-        self._read_complete_cb = None
-        self._read_failed_cb = None
-        self._read_base_address = 0
-
-        self._write_complete_cb = None
-        self._write_failed_cb = None
+        self.deck_memories = DeckMemories(self.MAX_NR_OF_DECK_MEM_INFOS)
+
+        # One deck memory object per deck memory info record, reused by queries as long as the record is valid
+        self._deck_memory_pool = [self._create_deck_memory(i) for i in range(self.MAX_NR_OF_DECK_MEM_INFOS)]
+
+        # Pending transfers, in the order they were requested, and the transfers in flight. Only one read
+        # and one write is in flight at a time. Requests that queue up in the mean time and directly
+        # follow each other in memory are merged into one transfer when the next one is started.
+        self._requests_lock = Lock()
+        self._read_requests = deque()
+        self._write_requests = deque()
+        self._reads_in_flight = None
+        self._writes_in_flight = None
         self._error = None
 
+        # Only called for this memory, no need to check the memory id in the callbacks
+        self.mem_handler.register(self.id, read_cb=self._new_data, read_failed_cb=self._new_data_failed,
+                                  write_cb=self._write_done, write_failed_cb=self._write_failed,
+                                  disconnected_cb=self._link_lost)
+
     def query_decks(self, query_complete_cb, query_failed_cb=None):
         if self._query_complete_cb is not None:
-            raise Exception('Query ongoing')
+            raise DeckMemoryError('Query ongoing')
 
         self._error = None
-        self.deck_memories = {}
+        self.deck_memories = DeckMemories(self.MAX_NR_OF_DECK_MEM_INFOS)
         self._query_complete_cb = query_complete_cb
         self._query_failed_cb = query_failed_cb
-        self.mem_handler.read(self, self.INFO_SECTION_ADDRESS, self.SIZE_OF_INFO_SECTION)
+        self._read(self.INFO_SECTION_ADDRESS, 0, self.SIZE_OF_INFO_SECTION, self._query_done, self._query_failed)
 
     def _read(self, base_address, address, length, read_complete_cb, read_failed_cb):
         """Called from deck memory to read data"""
-        if self._read_complete_cb is not None:
-            raise Exception('Read operation ongoing')
-
-        self._read_base_address = base_address
-        self._read_complete_cb = read_complete_cb
-        self._read_failed_cb = read_failed_cb
+        request = _TransferRequest(base_address, address + base_address, length, None, read_complete_cb,
+                                   read_failed_cb, None)
+
+        with self._requests_lock:
+            self._read_requests.append(request)
+            batch = self._next_batch(self._read_requests) if self._reads_in_flight is None else None
+            if batch is not None:
+                self._reads_in_flight = batch
+
+        if batch is not None:
+            self._start_read(batch)
+
+    def _start_read(self, batch):
+        self.mem_handler.read(self, batch[0].mapped_address, sum(request.length for request in batch))
+
+    def _next_batch(self, requests):
+        """
+        Remove the first queued request and the requests that directly follow it in memory from the queue.
+        Must be called with the requests lock held.
+        """
+        if not requests:
+            return None
 
-        mapped_address = address + self._read_base_address
-        self.mem_handler.read(self, mapped_address, length)
+        batch = [requests.popleft()]
+        end = batch[0].mapped_address + batch[0].length
+        length = batch[0].length
+        while requests and batch[-1].progress_cb is None:
+            request = requests[0]
+            if request.mapped_address != end or request.progress_cb is not None or \
+                    length + request.length > self.MAX_MERGED_TRANSFER_LENGTH:
+                break
+            batch.append(requests.popleft())
+            end += request.length
+            length += request.length
+
+        return batch
+
+    def _finish_reads_in_flight(self):
+        """Return the reads that are done and start the next ones, if any"""
+        with self._requests_lock:
+            batch = self._reads_in_flight
+            self._reads_in_flight = self._next_batch(self._read_requests)
+            next_batch = self._reads_in_flight
+
+        if next_batch is not None:
+            self._start_read(next_batch)
+        return batch
+
+    def _take_all_reads(self):
+        """Remove the reads in flight and all queued reads, no new reads are started"""
+        with self._requests_lock:
+            requests = list(self._reads_in_flight or [])
+            requests.extend(self._read_requests)
+            self._read_requests.clear()
+            self._reads_in_flight = None
+        return requests
+
+    def _query_done(self, addr, data):
+        try:
+            self.deck_memories = self._parse_info_section(data)
+            tmp_cb = self._query_complete_cb
+            self._clear_query_cb()
+            tmp_cb(self.deck_memories)
+        except RuntimeError as e:
+            tmp_cb = self._query_failed_cb
+            self._clear_query_cb()
+            if tmp_cb:
+                tmp_cb(str(e))
+
+    def _query_failed(self, addr):
+        tmp_cb = self._query_failed_cb
+        self._clear_query_cb()
+        if tmp_cb:
+            tmp_cb('Deck memory query failed')
+        else:
+            logger.error('Deck memory query failed')
 
     def _new_data(self, mem, addr, data):
         """Callback when new memory data has been fetched"""
-        if mem.id == self.id:
-            if addr == self.INFO_SECTION_ADDRESS:
-                try:
-                    self.deck_memories = self._parse_info_section(data)
-                    tmp_cb = self._query_complete_cb
-                    self._clear_query_cb()
-                    tmp_cb(self.deck_memories)
-                except RuntimeError as e:
-                    tmp_cb = self._query_failed_cb
-                    self._clear_query_cb()
-                    if tmp_cb:
-                        tmp_cb(str(e))
-            else:
-                tmp_cb = self._read_complete_cb
-                self._clear_read_cb()
-                tmp_cb(addr - self._read_base_address, data)
+        batch = self._finish_reads_in_flight()
+        if batch is None:
+            return
+
+        if len(batch) == 1:
+            batch[0].complete_cb(addr - batch[0].base_address, data)
+            return
+
+        for request in batch:
+            offset = request.mapped_address - addr
+            request.complete_cb(request.mapped_address - request.base_address,
+                                data[offset:offset + request.length])
 
     def _new_data_failed(self, mem, addr, data):
         """Callback when a read failed"""
-        if mem.id == self.id:
-            if addr == self.INFO_SECTION_ADDRESS:
-                self._clear_query_cb()
-                logger.error('Deck memory query failed')
+        batch = self._finish_reads_in_flight()
+        if batch is not None:
+            self._fail_reads(batch)
+
+    def _fail_reads(self, requests):
+        for request in requests:
+            if request.failed_cb is not None:
+                request.failed_cb(request.mapped_address - request.base_address)
             else:
-                tmp_cb = self._read_failed_cb
-                self._clear_read_cb()
-                if tmp_cb is not None:
-                    tmp_cb(addr - self._read_base_address)
-                else:
-                    logger.error('Deck memory read failed, addr: {}'.format(addr))
+                logger.error('Deck memory read failed, addr: {}'.format(request.mapped_address))
 
     def _clear_query_cb(self):
         self._query_complete_cb = None
         self._query_failed_cb = None
 
-    def _clear_read_cb(self):
-        self._read_complete_cb = None
-        self._read_failed_cb = None
-
     def _parse_info_section(self, data):
-        result = {}
+        result = DeckMemories(self.MAX_NR_OF_DECK_MEM_INFOS)
+
+        if len(data) < self.SIZE_OF_INFO_SECTION:
+            raise DeckMemoryError(f'Deck memory info section too short ({len(data)} bytes)')
 
-        version = struct.unpack('<B', data[0:1])[0]
+        version = data[0]
         if version != self.SUPPORTED_VERSION:
-            raise RuntimeError(f'Deck memory version {version} not supported')
-        else:
-            for i in range(self.MAX_NR_OF_DECK_MEM_INFOS):
-                deck_memory = DeckMemory(self, self.COMMAND_SECTION_ADDRESS + i * self.SIZE_OF_COMMAND_SECTION)
-                start = self.SIZE_OF_VERSION + self.SIZE_OF_DECK_MEM_INFO * i
-                end = start + self.SIZE_OF_DECK_MEM_INFO
-                deck_memory._parse(data[start:end])
+            raise DeckMemoryError(f'Deck memory version {version} not supported')
+
+        infos = memoryview(data)[self.SIZE_OF_VERSION:self.SIZE_OF_INFO_SECTION]
+        for i, (bit_field1, bit_field2, required_hash, required_length, base_address, name) in \
+                enumerate(self._DECK_MEM_INFO.iter_unpack(infos)):
+            deck_memory = self._deck_memory_pool[i]
+            if not bit_field1 & DeckMemory.MASK_IS_VALID:
                 if deck_memory.is_valid:
-                    result[i] = deck_memory
+                    # The object might be in use from an earlier query, leave it as it is
+                    self._deck_memory_pool[i] = self._create_deck_memory(i)
+                continue
+
+            deck_memory._set_bit_fields(bit_field1, bit_field2)
+            deck_memory.required_hash = required_hash
+            deck_memory.required_length = required_length
+            deck_memory._base_address = base_address
+            deck_memory._name_raw = name
+            deck_memory._name = None
+            result._set(i, deck_memory)
 
         return result
 
+    def _create_deck_memory(self, index):
+        return DeckMemory(self, self.COMMAND_SECTION_ADDRESS + index * self.SIZE_OF_COMMAND_SECTION)
+
     def _write(self, base_address, address, data, complete_cb, failed_cb, progress_cb):
         """Called from deck memory to write data"""
-        if self._write_complete_cb is not None:
-            raise Exception('Write operation ongoing')
+        # Keep a copy, the caller may change its buffer while the write is queued
+        request = _TransferRequest(base_address, address + base_address, len(data), bytes(data), complete_cb,
+                                   failed_cb, progress_cb)
+
+        with self._requests_lock:
+            self._write_requests.append(request)
+            batch = self._next_batch(self._write_requests) if self._writes_in_flight is None else None
+            if batch is not None:
+                self._writes_in_flight = batch
+
+        if batch is not None:
+            self._start_write(batch)
+
+    def _start_write(self, batch):
+        if len(batch) == 1:
+            data = batch[0].data
+        else:
+            data = b''.join(request.data for request in batch)
+        self.mem_handler.write(self, batch[0].mapped_address, data, progress_cb=batch[0].progress_cb)
 
-        self._write_complete_cb = complete_cb
-        self._write_failed_cb = failed_cb
+    def _finish_writes_in_flight(self):
+        """Return the writes that are done and start the next ones, if any"""
+        with self._requests_lock:
+            batch = self._writes_in_flight
+            self._writes_in_flight = self._next_batch(self._write_requests)
+            next_batch = self._writes_in_flight
 
-        mapped_address = address + base_address
-        self.mem_handler.write(self, mapped_address, data, flush_queue=True, progress_cb=progress_cb)
+        if next_batch is not None:
+            self._start_write(next_batch)
+        return batch
 
     def _write_done(self, mem, addr):
-        if mem.id == self.id:
-            logger.debug('Write data done')
+        logger.debug('Write data done')
+
+        batch = self._finish_writes_in_flight()
+        if batch is None:
+            return
+
+        for request in batch:
+            request.complete_cb(request.mapped_address - request.base_address)
 
-            tmp_cb = self._write_complete_cb
-            self._clear_write_cb()
-            tmp_cb(addr - self._read_base_address)
+    def _take_all_writes(self):
+        """Remove the writes in flight and all queued writes, no new writes are started"""
+        with self._requests_lock:
+            requests = list(self._writes_in_flight or [])
+            requests.extend(self._write_requests)
+            self._write_requests.clear()
+            self._writes_in_flight = None
+        return requests
 
     def _write_failed(self, mem, addr):
-        if mem.id == self.id:
-            logger.debug('Write failed')
+        logger.debug('Write failed')
 
-            tmp_cb = self._write_failed_cb
-            self._clear_write_cb()
-            tmp_cb(addr - self._read_base_address)
+        batch = self._finish_writes_in_flight()
+        if batch is not None:
+            self._fail_writes(batch)
+
+    def _fail_writes(self, requests):
+        for request in requests:
+            if request.failed_cb is not None:
+                request.failed_cb(request.mapped_address - request.base_address)
+            else:
+                logger.error('Deck memory write failed, addr: {}'.format(request.mapped_address))
 
-    def _clear_write_cb(self):
-        self._write_complete_cb = None
-        self._write_failed_cb = None
+    def _link_lost(self):
+        """Callback when the link is lost, fail all transfers instead of starting queued ones on a dead link"""
+        self._fail_reads(self._take_all_reads())
+        self._fail_writes(self._take_all_writes())
 
     def disconnect(self):
+        self._fail_reads(self._take_all_reads())
+        self._fail_writes(self._take_all_writes())
         self._clear_query_cb()
-        self._clear_read_cb()
-        self._clear_write_cb()
-        self.deck_memories = {}
+        self.mem_handler.unregister(self.id)
+        self.deck_memories = DeckMemories(self.MAX_NR_OF_DECK_MEM_INFOS)
 
 
 class SyncDeckMemoryManager:
@@ -0,0 +1,567 @@
+# -*- coding: utf-8 -*-
+#
+# ,---------,       ____  _ __
+# |  ,-^-,  |      / __ )(_) /_______________ _____  ___
+# | (  O  ) |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+# | / ,--'  |    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#    +------`   /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+# Copyright (C) 2021 Bitcraze AB
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, in version 3.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+import struct
+import unittest
+from unittest.mock import MagicMock
+
+from cflib.crazyflie.mem import DeckMemoryManager
+from cflib.crazyflie.mem import Memory
+from cflib.crazyflie.mem.deck_memory import DeckMemory
+from cflib.crazyflie.mem.deck_memory import DeckMemoryError
+
+
+class TestDeckMemory(unittest.TestCase):
+    def setUp(self):
+        self.mem_handler_mock = MagicMock()
+        self.sut = DeckMemoryManager(id=7, type=0x19, size=0x10000, mem_handler=self.mem_handler_mock)
+
+    def test_that_callbacks_are_registered_for_own_memory_id(self):
+        # Fixture
+        # Test
+        self.sut.disconnect()
+
+        # Assert
+        self.mem_handler_mock.register.assert_called_once_with(
+            7, read_cb=self.sut._new_data, read_failed_cb=self.sut._new_data_failed,
+            write_cb=self.sut._write_done, write_failed_cb=self.sut._write_failed,
+            disconnected_cb=self.sut._link_lost)
+        self.mem_handler_mock.unregister.assert_called_once_with(7)
+
+    def test_that_valid_deck_is_parsed(self):
+        # Fixture
+        bit_field1 = DeckMemory.MASK_IS_VALID | DeckMemory.MASK_IS_STARTED | DeckMemory.MASK_SUPPORTS_READ
+        data = self._info_section({1: self._deck_mem_info(bit_field1, 0, 0x1234, 0x5678, 0x10000000, b'bcAI:gap8')})
+
+        # Test
+        actual = self.sut._parse_info_section(data)
+
+        # Assert
+        self.assertEqual([1], list(actual.keys()))
+        deck = actual[1]
+        self.assertTrue(deck.is_valid)
+        self.assertTrue(deck.is_started)
+        self.assertTrue(deck.supports_read)
+        self.assertFalse(deck.supports_write)
+        self.assertEqual(0x1234, deck.required_hash)
+        self.assertEqual(0x5678, deck.required_length)
+        self.assertEqual('bcAI:gap8', deck.name)
+        self.assertTrue(deck.contains(0x10000000))
+        self.assertFalse(deck.contains(0x20000000))
+
+    def test_that_second_bit_field_is_parsed(self):
+        # Fixture
+        bit_field2 = DeckMemory.MASK_SUPPORTS_RESET_TO_BOOTLOADER
+        data = self._info_section({0: self._deck_mem_info(DeckMemory.MASK_IS_VALID, bit_field2, 0, 0, 0, b'')})
+
+        # Test
+        actual = self.sut._parse_info_section(data)
+
+        # Assert
+        self.assertFalse(actual[0].supports_reset_to_fw)
+        self.assertTrue(actual[0].supports_reset_to_bootloader)
+
+    def test_that_flags_tuple_matches_flag_attributes(self):
+        # Fixture
+        bit_field1 = DeckMemory.MASK_IS_VALID | DeckMemory.MASK_SUPPORTS_UPGRADE | DeckMemory.MASK_BOOTLOADER_ACTIVE
+        bit_field2 = DeckMemory.MASK_SUPPORTS_RESET_TO_FW
+        data = self._info_section({0: self._deck_mem_info(bit_field1, bit_field2, 0, 0, 0, b'')})
+
+        # Test
+        actual = self.sut._parse_info_section(data)[0]
+
+        # Assert
+        for name, value in actual.flags._asdict().items():
+            self.assertEqual(getattr(actual, name), value, name)
+        self.assertEqual(4, sum(actual.flags))
+
+    def test_that_flags_are_read_only(self):
+        # Fixture
+        bit_field1 = DeckMemory.MASK_IS_VALID | DeckMemory.MASK_SUPPORTS_WRITE
+        data = self._info_section({0: self._deck_mem_info(bit_field1, 0, 0, 0, 0, b'')})
+        actual = self.sut._parse_info_section(data)[0]
+
+        # Test
+        # Assert
+        with self.assertRaises(AttributeError):
+            actual.supports_write = False
+        with self.assertRaises(AttributeError):
+            actual.flags = None
+        self.assertTrue(actual.supports_write)
+
+    def test_that_name_without_terminator_is_parsed(self):
+        # Fixture
+        name = b'abcdefghijklmnopqr'
+        data = self._info_section({0: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 0, 0, 0, name)})
+
+        # Test
+        actual = self.sut._parse_info_section(data)
+
+        # Assert
+        self.assertEqual('abcdefghijklmnopqr', actual[0].name)
+
+    def test_that_non_ascii_name_is_replaced(self):
+        # Fixture
+        data = self._info_section({0: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 0, 0, 0, b'ab\xffc')})
+
+        # Test
+        actual = self.sut._parse_info_section(data)
+
+        # Assert
+        self.assertEqual('ab\ufffdc', actual[0].name)
+
+    def test_that_invalid_decks_are_skipped(self):
+        # Fixture
+        data = self._info_section({
+            0: self._deck_mem_info(0, 0, 1, 2, 3, b'invalid'),
+            5: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 1, 2, 3, b'valid'),
+        })
+
+        # Test
+        actual = self.sut._parse_info_section(data)
+
+        # Assert
+        self.assertEqual([5], list(actual.keys()))
+
+    def test_that_deck_memories_can_be_accessed_by_index(self):
+        # Fixture
+        data = self._info_section({
+            2: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 1, 2, 3, b'first'),
+            6: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 1, 2, 3, b'second'),
+        })
+
+        # Test
+        actual = self.sut._parse_info_section(data)
+
+        # Assert
+        self.assertEqual(2, len(actual))
+        self.assertEqual([(2, 'first'), (6, 'second')], [(i, deck.name) for i, deck in actual.items()])
+        self.assertIn(6, actual)
+        self.assertNotIn(0, actual)
+        self.assertIsNone(actual.get(-1))
+        with self.assertRaises(KeyError):
+            actual[8]
+        with self.assertRaises(KeyError):
+            actual[2:7]
+        with self.assertRaises(KeyError):
+            actual['2']
+
+    def test_that_deck_memory_objects_are_reused_between_queries(self):
+        # Fixture
+        first = self.sut._parse_info_section(self._info_section({
+            1: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 1, 2, 3, b'first'),
+            3: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 1, 2, 3, b'gone'),
+        }))
+        self.assertEqual('first', first[1].name)
+
+        # Test
+        second = self.sut._parse_info_section(self._info_section({
+            1: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 4, 5, 6, b'second'),
+        }))
+
+        # Assert
+        self.assertIs(first[1], second[1])
+        self.assertEqual('second', second[1].name)
+        self.assertEqual(4, second[1].required_hash)
+        self.assertNotIn(3, second)
+
+    def test_that_deck_from_earlier_query_is_kept_when_its_slot_disappears(self):
+        # Fixture
+        first = self.sut._parse_info_section(self._info_section({
+            3: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 1, 2, 0x10000000, b'gone'),
+        }))
+
+        # Test
+        second = self.sut._parse_info_section(self._info_section({}))
+        third = self.sut._parse_info_section(self._info_section({
+            3: self._deck_mem_info(DeckMemory.MASK_IS_VALID, 0, 4, 5, 0x20000000, b'back'),
+        }))
+
+        # Assert
+        self.assertNotIn(3, second)
+        self.assertEqual([3], list(first.keys()))
+        old_deck = first[3]
+        self.assertTrue(old_deck.is_valid)
+        self.assertEqual('gone', old_deck.name)
+        self.assertEqual(1, old_deck.required_hash)
+        self.assertTrue(old_deck.contains(0x10000000))
+        self.assertIsNot(old_deck, third[3])
+        self.assertEqual('back', third[3].name)
+
+    def test_that_unsupported_version_raises(self):
+        # Fixture
+        data = self._info_section({}, version=2)
+
+        # Test
+        # Assert
+        with self.assertRaises(RuntimeError):
+            self.sut._parse_info_section(data)
+
+    def test_that_truncated_info_section_raises(self):
+        # Fixture
+        data = self._info_section({})[:-1]
+
+        # Test
+        # Assert
+        with self.assertRaises(RuntimeError):
+            self.sut._parse_info_section(data)
+
+    def test_that_write_done_reports_address_relative_to_write_base(self):
+        # Fixture
+        read_cb = MagicMock()
+        write_cb = MagicMock()
+        self.sut._read(0x20000000, 0x10, 4, read_cb, None)
+        self.sut._write(0x10000000, 0x40, b'1234', write_cb, None, None)
+        mem = MagicMock(id=self.sut.id)
+
+        # Test
+        self.sut._write_done(mem, 0x10000040)
+
+        # Assert
+        write_cb.assert_called_once_with(0x40)
+
+    def test_that_write_failed_reports_address_relative_to_write_base(self):
+        # Fixture
+        read_cb = MagicMock()
+        write_failed_cb = MagicMock()
+        self.sut._read(0x20000000, 0x10, 4, read_cb, None)
+        self.sut._write(0x10000000, 0x40, b'1234', MagicMock(), write_failed_cb, None)
+        mem = MagicMock(id=self.sut.id)
+
+        # Test
+        self.sut._write_failed(mem, 0x10000040)
+
+        # Assert
+        write_failed_cb.assert_called_once_with(0x40)
+
+    def test_that_read_and_write_require_started_deck_with_support(self):
+        # Fixture
+        bit_field1 = DeckMemory.MASK_IS_VALID | DeckMemory.MASK_SUPPORTS_READ | DeckMemory.MASK_SUPPORTS_WRITE
+        data = self._info_section({0: self._deck_mem_info(bit_field1, 0, 0, 0, 0x10000000, b'')})
+        deck = self.sut._parse_info_section(data)[0]
+
+        # Test
+        # Assert
+        with self.assertRaisesRegex(DeckMemoryError, 'not ready'):
+            deck.read(0, 4, MagicMock())
+        with self.assertRaisesRegex(DeckMemoryError, 'not ready'):
+            deck.write(0, b'1234', MagicMock())
+
+    def test_that_read_requires_read_support(self):
+        # Fixture
+        bit_field1 = DeckMemory.MASK_IS_VALID | DeckMemory.MASK_IS_STARTED | DeckMemory.MASK_SUPPORTS_WRITE
+        data = self._info_section({0: self._deck_mem_info(bit_field1, 0, 0, 0, 0x10000000, b'')})
+        deck = self.sut._parse_info_section(data)[0]
+
+        # Test
+        deck.write(0x10, b'1234', MagicMock())
+
+        # Assert
+        with self.assertRaisesRegex(DeckMemoryError, 'does not support read'):
+            deck.read(0, 4, MagicMock())
+        self.mem_handler_mock.write.assert_called_once_with(self.sut, 0x10000010, b'1234', progress_cb=None)
+
+    def test_that_reads_are_queued_and_started_in_order(self):
+        # Fixture
+        read_cb_1 = MagicMock()
+        read_cb_2 = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+
+        # Test
+        self.sut._read(0x10000000, 0x10, 4, read_cb_1, None)
+        self.sut._read(0x20000000, 0x20, 8, read_cb_2, None)
+
+        # Assert
+        self.mem_handler_mock.read.assert_called_once_with(self.sut, 0x10000010, 4)
+
+        self.sut._new_data(mem, 0x10000010, b'1234')
+        read_cb_1.assert_called_once_with(0x10, b'1234')
+        self.mem_handler_mock.read.assert_called_with(self.sut, 0x20000020, 8)
+
+        self.sut._new_data(mem, 0x20000020, b'12345678')
+        read_cb_2.assert_called_once_with(0x20, b'12345678')
+        self.assertEqual(2, self.mem_handler_mock.read.call_count)
+
+    def test_that_query_is_queued_after_ongoing_read(self):
+        # Fixture
+        read_cb = MagicMock()
+        query_cb = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+        self.sut._read(0x10000000, 0x10, 4, read_cb, None)
+
+        # Test
+        self.sut.query_decks(query_cb)
+        self.sut._new_data(mem, 0x10000010, b'1234')
+        self.sut._new_data(mem, DeckMemoryManager.INFO_SECTION_ADDRESS, self._info_section({}))
+
+        # Assert
+        read_cb.assert_called_once_with(0x10, b'1234')
+        query_cb.assert_called_once_with(self.sut.deck_memories)
+
+    def test_that_writes_are_queued(self):
+        # Fixture
+        write_cb_1 = MagicMock()
+        write_cb_2 = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+
+        # Test
+        self.sut._write(0x10000000, 0x40, b'1234', write_cb_1, None, None)
+        self.sut._write(0x10000000, 0x44, b'5678', write_cb_2, None, None)
+        self.sut._write_done(mem, 0x10000040)
+        self.sut._write_done(mem, 0x10000044)
+
+        # Assert
+        self.assertEqual(2, self.mem_handler_mock.write.call_count)
+        write_cb_1.assert_called_once_with(0x40)
+        write_cb_2.assert_called_once_with(0x44)
+
+    def test_that_queued_adjacent_reads_are_merged(self):
+        # Fixture
+        read_cb_1 = MagicMock()
+        read_cb_2 = MagicMock()
+        read_cb_3 = MagicMock()
+        read_cb_4 = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+        self.sut._read(0x10000000, 0x00, 4, read_cb_1, None)
+
+        # Test
+        self.sut._read(0x10000000, 0x10, 4, read_cb_2, None)
+        self.sut._read(0x10000000, 0x14, 2, read_cb_3, None)
+        self.sut._read(0x10000000, 0x20, 2, read_cb_4, None)
+        self.sut._new_data(mem, 0x10000000, b'0000')
+        self.sut._new_data(mem, 0x10000010, bytearray(b'abcdef'))
+
+        # Assert
+        self.mem_handler_mock.read.assert_called_with(self.sut, 0x10000020, 2)
+        self.assertEqual(3, self.mem_handler_mock.read.call_count)
+        self.assertEqual((self.sut, 0x10000010, 6), self.mem_handler_mock.read.call_args_list[1][0])
+        read_cb_2.assert_called_once_with(0x10, b'abcd')
+        read_cb_3.assert_called_once_with(0x14, b'ef')
+        read_cb_4.assert_not_called()
+
+    def test_that_failed_merged_read_fails_all_requests(self):
+        # Fixture
+        read_failed_cb_2 = MagicMock()
+        read_failed_cb_3 = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+        self.sut._read(0x10000000, 0x00, 4, MagicMock(), None)
+        self.sut._read(0x10000000, 0x10, 4, MagicMock(), read_failed_cb_2)
+        self.sut._read(0x10000000, 0x14, 2, MagicMock(), read_failed_cb_3)
+        self.sut._new_data(mem, 0x10000000, b'0000')
+
+        # Test
+        self.sut._new_data_failed(mem, 0x10000010, bytearray())
+
+        # Assert
+        read_failed_cb_2.assert_called_once_with(0x10)
+        read_failed_cb_3.assert_called_once_with(0x14)
+
+    def test_that_queued_adjacent_writes_without_progress_are_merged(self):
+        # Fixture
+        write_cb_2 = MagicMock()
+        write_cb_3 = MagicMock()
+        progress_cb = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+        self.sut._write(0x10000000, 0x00, b'0000', MagicMock(), None, None)
+
+        # Test
+        self.sut._write(0x10000000, 0x10, b'ab', write_cb_2, None, None)
+        self.sut._write(0x10000000, 0x12, bytearray(b'cd'), write_cb_3, None, None)
+        self.sut._write(0x10000000, 0x14, b'ef', MagicMock(), None, progress_cb)
+        self.sut._write_done(mem, 0x10000000)
+        self.sut._write_done(mem, 0x10000010)
+
+        # Assert
+        self.assertEqual(3, self.mem_handler_mock.write.call_count)
+        self.mem_handler_mock.write.assert_any_call(self.sut, 0x10000010, b'abcd', progress_cb=None)
+        self.mem_handler_mock.write.assert_called_with(self.sut, 0x10000014, b'ef', progress_cb=progress_cb)
+        write_cb_2.assert_called_once_with(0x10)
+        write_cb_3.assert_called_once_with(0x12)
+
+    def test_that_queued_reads_fail_when_link_is_lost(self):
+        # Fixture
+        cf_mock = MagicMock()
+        memory = Memory(cf_mock)
+        sut = DeckMemoryManager(id=7, type=0x19, size=0x10000, mem_handler=memory)
+        read_failed_cb_1 = MagicMock()
+        read_failed_cb_2 = MagicMock()
+        sut._read(0x10000000, 0x10, 4, MagicMock(), read_failed_cb_1)
+        sut._read(0x20000000, 0x20, 4, MagicMock(), read_failed_cb_2)
+        packets_sent = cf_mock.send_packet.call_count
+
+        # Test
+        memory._disconnected('uri')
+
+        # Assert
+        read_failed_cb_1.assert_called_once_with(0x10)
+        read_failed_cb_2.assert_called_once_with(0x20)
+        self.assertEqual(packets_sent, cf_mock.send_packet.call_count)
+        self.assertIsNone(sut._reads_in_flight)
+        self.assertEqual(0, len(sut._read_requests))
+
+    def test_that_queued_reads_and_writes_fail_when_link_is_lost(self):
+        # Fixture
+        cf_mock = MagicMock()
+        memory = Memory(cf_mock)
+        sut = DeckMemoryManager(id=7, type=0x19, size=0x10000, mem_handler=memory)
+        read_failed_cbs = [MagicMock(), MagicMock()]
+        write_failed_cbs = [MagicMock(), MagicMock()]
+        sut._read(0x10000000, 0x10, 4, MagicMock(), read_failed_cbs[0])
+        sut._read(0x20000000, 0x20, 4, MagicMock(), read_failed_cbs[1])
+        sut._write(0x10000000, 0x40, b'1234', MagicMock(), write_failed_cbs[0], None)
+        sut._write(0x20000000, 0x50, b'5678', MagicMock(), write_failed_cbs[1], None)
+        packets_sent = cf_mock.send_packet.call_count
+
+        # Test
+        memory._disconnected('uri')
+
+        # Assert
+        read_failed_cbs[0].assert_called_once_with(0x10)
+        read_failed_cbs[1].assert_called_once_with(0x20)
+        write_failed_cbs[0].assert_called_once_with(0x40)
+        write_failed_cbs[1].assert_called_once_with(0x50)
+        self.assertEqual(packets_sent, cf_mock.send_packet.call_count)
+        self.assertIsNone(sut._reads_in_flight)
+        self.assertIsNone(sut._writes_in_flight)
+
+    def test_that_failed_write_only_fails_own_request(self):
+        # Fixture
+        write_failed_cb_1 = MagicMock()
+        write_failed_cb_2 = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+        self.sut._write(0x10000000, 0x40, b'1234', MagicMock(), write_failed_cb_1, None)
+        self.sut._write(0x20000000, 0x50, b'5678', MagicMock(), write_failed_cb_2, None)
+
+        # Test
+        self.sut._write_failed(mem, 0x10000040)
+
+        # Assert
+        write_failed_cb_1.assert_called_once_with(0x40)
+        write_failed_cb_2.assert_not_called()
+        self.mem_handler_mock.write.assert_called_with(self.sut, 0x20000050, b'5678', progress_cb=None)
+
+    def test_that_changing_the_data_of_a_queued_write_has_no_effect(self):
+        # Fixture
+        data = bytearray(b'5678')
+        mem = MagicMock(id=self.sut.id)
+        self.sut._write(0x10000000, 0x40, b'1234', MagicMock(), MagicMock(), None)
+        self.sut._write(0x20000000, 0x50, data, MagicMock(), MagicMock(), None)
+
+        # Test
+        data[0] = ord('x')
+        self.sut._write_done(mem, 0x10000040)
+
+        # Assert
+        self.mem_handler_mock.write.assert_called_with(self.sut, 0x20000050, b'5678', progress_cb=None)
+
+    def test_that_queued_writes_fail_on_disconnect(self):
+        # Fixture
+        write_failed_cb_1 = MagicMock()
+        write_failed_cb_2 = MagicMock()
+        self.sut._write(0x10000000, 0x40, b'1234', MagicMock(), write_failed_cb_1, None)
+        self.sut._write(0x20000000, 0x50, b'5678', MagicMock(), write_failed_cb_2, None)
+
+        # Test
+        self.sut.disconnect()
+
+        # Assert
+        write_failed_cb_1.assert_called_once_with(0x40)
+        write_failed_cb_2.assert_called_once_with(0x50)
+        self.assertEqual(1, self.mem_handler_mock.write.call_count)
+
+    def test_that_queued_reads_fail_on_disconnect(self):
+        # Fixture
+        read_failed_cb_1 = MagicMock()
+        read_failed_cb_2 = MagicMock()
+        query_failed_cb = MagicMock()
+        self.sut._read(0x10000000, 0x10, 4, MagicMock(), read_failed_cb_1)
+        self.sut._read(0x20000000, 0x20, 4, MagicMock(), read_failed_cb_2)
+        self.sut.query_decks(MagicMock(), query_failed_cb)
+
+        # Test
+        self.sut.disconnect()
+
+        # Assert
+        read_failed_cb_1.assert_called_once_with(0x10)
+        read_failed_cb_2.assert_called_once_with(0x20)
+        query_failed_cb.assert_called_once()
+        self.assertEqual(1, self.mem_handler_mock.read.call_count)
+        self.assertIsNone(self.sut._query_complete_cb)
+
+    def test_that_failed_read_only_fails_own_request(self):
+        # Fixture
+        read_failed_cb_1 = MagicMock()
+        read_failed_cb_2 = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+        self.sut._read(0x10000000, 0x10, 4, MagicMock(), read_failed_cb_1)
+        self.sut._read(0x20000000, 0x20, 4, MagicMock(), read_failed_cb_2)
+
+        # Test
+        self.sut._new_data_failed(mem, 0x10000010, bytearray())
+
+        # Assert
+        read_failed_cb_1.assert_called_once_with(0x10)
+        read_failed_cb_2.assert_not_called()
+        self.mem_handler_mock.read.assert_called_with(self.sut, 0x20000020, 4)
+
+    def test_that_query_queued_after_failed_read_is_started(self):
+        # Fixture
+        cf_mock = MagicMock()
+        memory = Memory(cf_mock)
+        sut = DeckMemoryManager(id=7, type=0x19, size=0x10000, mem_handler=memory)
+        read_failed_cb = MagicMock()
+        query_complete_cb = MagicMock()
+        query_failed_cb = MagicMock()
+        sut._read(0x10000000, 0xFFFFFF, 4, MagicMock(), read_failed_cb)
+        sut.query_decks(query_complete_cb, query_failed_cb)
+
+        # Test
+        memory._handle_chan_read(7, bytearray(struct.pack('<IB', 0x10FFFFFF, 1)))
+
+        # Assert
+        read_failed_cb.assert_called_once_with(0xFFFFFF)
+        query_failed_cb.assert_not_called()
+        self.assertEqual(0, memory._read_requests[7].addr)
+        self.assertEqual(DeckMemoryManager.SIZE_OF_INFO_SECTION, memory._read_requests[7]._bytes_left)
+
+    def test_that_query_fails_when_read_fails(self):
+        # Fixture
+        query_failed_cb = MagicMock()
+        mem = MagicMock(id=self.sut.id)
+        self.sut.query_decks(MagicMock(), query_failed_cb)
+
+        # Test
+        self.sut._new_data_failed(mem, 0, bytearray())
+
+        # Assert
+        query_failed_cb.assert_called_once()
+        self.assertIsNone(self.sut._query_complete_cb)
+
+    def _deck_mem_info(self, bit_field1, bit_field2, required_hash, required_length, base_address, name):
+        return struct.pack('<BBLLL18s', bit_field1, bit_field2, required_hash, required_length, base_address, name)
+
+    def _info_section(self, infos, version=DeckMemoryManager.SUPPORTED_VERSION):
+        data = bytearray(DeckMemoryManager.SIZE_OF_INFO_SECTION)
+        data[0] = version
+        for i, info in infos.items():
+            start = DeckMemoryManager.SIZE_OF_VERSION + DeckMemoryManager.SIZE_OF_DECK_MEM_INFO * i
+            data[start:start + DeckMemoryManager.SIZE_OF_DECK_MEM_INFO] = info
+        return data
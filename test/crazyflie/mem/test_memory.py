@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+# ,---------,       ____  _ __
+# |  ,-^-,  |      / __ )(_) /_______________ _____  ___
+# | (  O  ) |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+# | / ,--'  |    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#    +------`   /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+# Copyright (C) 2021 Bitcraze AB
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, in version 3.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+import struct
+import unittest
+from unittest.mock import MagicMock
+
+from cflib.crazyflie.mem import _ReadRequest
+from cflib.crazyflie.mem import Memory
+from cflib.crazyflie.mem import _WriteRequest
+
+
+class TestWriteRequest(unittest.TestCase):
+    def setUp(self):
+        self.cf_mock = MagicMock()
+        self.mem_mock = MagicMock(id=3)
+
+    def test_that_data_is_split_in_chunks(self):
+        # Fixture
+        data = bytearray(range(60))
+        sut = _WriteRequest(self.mem_mock, 0x100, data, self.cf_mock)
+
+        # Test
+        sut.start()
+        while not sut.write_done(sut._current_addr):
+            pass
+
+        # Assert
+        packets = [args[0][0] for args in self.cf_mock.send_packet.call_args_list]
+        self.assertEqual(3, len(packets))
+        self.assertEqual(struct.pack('<BI', 3, 0x100) + bytes(range(0, 25)), bytes(packets[0].data))
+        self.assertEqual(struct.pack('<BI', 3, 0x119) + bytes(range(25, 50)), bytes(packets[1].data))
+        self.assertEqual(struct.pack('<BI', 3, 0x132) + bytes(range(50, 60)), bytes(packets[2].data))
+
+    def test_that_data_can_be_a_tuple(self):
+        # Fixture
+        sut = _WriteRequest(self.mem_mock, 0x100, (1, 2, 3), self.cf_mock)
+
+        # Test
+        sut.start()
+
+        # Assert
+        packet = self.cf_mock.send_packet.call_args[0][0]
+        self.assertEqual(struct.pack('<BI', 3, 0x100) + b'\x01\x02\x03', bytes(packet.data))
+
+    def test_that_changing_the_data_after_the_request_is_created_has_no_effect(self):
+        # Fixture
+        data = bytearray(b'abc')
+        sut = _WriteRequest(self.mem_mock, 0x100, data, self.cf_mock)
+
+        # Test
+        data[0] = ord('x')
+        sut.start()
+
+        # Assert
+        packet = self.cf_mock.send_packet.call_args[0][0]
+        self.assertEqual(b'abc', bytes(packet.data[5:]))
+
+
+class TestReadRequest(unittest.TestCase):
+    def setUp(self):
+        self.cf_mock = MagicMock()
+        self.mem_mock = MagicMock(id=3)
+
+    def test_that_data_from_memoryview_is_added(self):
+        # Fixture
+        sut = _ReadRequest(self.mem_mock, 0x100, 24, self.cf_mock)
+        payload = bytearray(b'abcdefghijklmnopqrstuvwx')
+
+        # Test
+        first_done = sut.add_data(0x100, memoryview(payload)[:20])
+        second_done = sut.add_data(0x114, memoryview(payload)[20:])
+        payload[0] = ord('A')
+
+        # Assert
+        self.assertFalse(first_done)
+        self.assertTrue(second_done)
+        self.assertEqual(bytearray(b'abcdefghijklmnopqrstuvwx'), sut.data)
+
+
+class TestMemoryRegisteredCallbacks(unittest.TestCase):
+    def setUp(self):
+        self.cf_mock = MagicMock()
+        self.sut = Memory(self.cf_mock)
+        self.mem_1 = MagicMock(id=1)
+        self.mem_2 = MagicMock(id=2)
+
+    def test_that_registered_read_callback_is_only_called_for_own_memory(self):
+        # Fixture
+        read_cb = MagicMock()
+        shared_read_cb = MagicMock()
+        self.sut.register(1, read_cb=read_cb)
+        self.sut.mem_read_cb.add_callback(shared_read_cb)
+
+        # Test
+        self._read(self.mem_2, 0x10, b'ab')
+        self._read(self.mem_1, 0x20, b'cd')
+
+        # Assert
+        read_cb.assert_called_once_with(self.mem_1, 0x20, bytearray(b'cd'))
+        self.assertEqual(2, shared_read_cb.call_count)
+
+    def test_that_registered_write_callbacks_are_only_called_for_own_memory(self):
+        # Fixture
+        write_cb = MagicMock()
+        write_failed_cb = MagicMock()
+        shared_write_cb = MagicMock()
+        self.sut.register(1, write_cb=write_cb, write_failed_cb=write_failed_cb)
+        self.sut.mem_write_cb.add_callback(shared_write_cb)
+
+        # Test
+        self._write(self.mem_2, 0x10, b'ab', status=0)
+        self._write(self.mem_1, 0x20, b'cd', status=0)
+        self._write(self.mem_1, 0x30, b'ef', status=1)
+
+        # Assert
+        write_cb.assert_called_once_with(self.mem_1, 0x20)
+        write_failed_cb.assert_called_once_with(self.mem_1, 0x30)
+        self.assertEqual(2, shared_write_cb.call_count)
+
+    def test_that_registered_read_failed_callback_is_called_on_disconnect(self):
+        # Fixture
+        read_failed_cb = MagicMock()
+        self.sut.register(1, read_failed_cb=read_failed_cb)
+        self.sut.read(self.mem_1, 0x20, 2)
+
+        # Test
+        self.sut._disconnected('uri')
+
+        # Assert
+        read_failed_cb.assert_called_once_with(self.mem_1, 0x20, bytearray())
+
+    def test_that_registered_disconnected_callback_is_called_before_failed_callbacks(self):
+        # Fixture
+        calls = MagicMock()
+        self.sut.register(1, read_failed_cb=calls.read_failed_cb, disconnected_cb=calls.disconnected_cb)
+        self.sut.read(self.mem_1, 0x20, 2)
+
+        # Test
+        self.sut._disconnected('uri')
+
+        # Assert
+        self.assertEqual(['disconnected_cb', 'read_failed_cb'], [call[0] for call in calls.mock_calls])
+
+    def test_that_unregistered_callbacks_are_not_called(self):
+        # Fixture
+        read_cb = MagicMock()
+        write_cb = MagicMock()
+        shared_read_cb = MagicMock()
+        self.sut.register(1, read_cb=read_cb, write_cb=write_cb)
+        self.sut.mem_read_cb.add_callback(shared_read_cb)
+
+        # Test
+        self.sut.unregister(1)
+        self._read(self.mem_1, 0x20, b'cd')
+        self._write(self.mem_1, 0x20, b'cd', status=0)
+
+        # Assert
+        read_cb.assert_not_called()
+        write_cb.assert_not_called()
+        shared_read_cb.assert_called_once_with(self.mem_1, 0x20, bytearray(b'cd'))
+
+    def _read(self, mem, addr, data):
+        self.sut.read(mem, addr, len(data))
+        self.sut._handle_chan_read(mem.id, bytearray(struct.pack('<IB', addr, 0) + data))
+
+    def _write(self, mem, addr, data, status):
+        self.sut.write(mem, addr, data)
+        self.sut._handle_chan_write(mem.id, bytearray(struct.pack('<IB', addr, status)))